@@ -1,6 +1,9 @@
 """
 Module for basic chromatograms
 """
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
 from .spectrum import NON_MASS_KEYS
 
 
@@ -41,20 +44,19 @@ def generate_EIC(
     if "ms1" in ms_data:
         ms_data = ms_data["ms1"]
 
-    #  filter by retention time
+    if max_rt is None:
+        max_rt = float("inf")
+
+    #  filter by retention time in a single pass, converting each retention
+    #  time only once
     ms_data = [
-        spec
-        for spec in ms_data.values()
-        if float(spec["retention_time"]) >= min_rt
+        (retention_time, spec)
+        for retention_time, spec in (
+            (float(spec["retention_time"]), spec) for spec in ms_data.values()
+        )
+        if min_rt <= retention_time <= max_rt
     ]
 
-    if max_rt:
-        ms_data = [
-            spec
-            for spec in ms_data.values()
-            if float(spec["retention_time"]) <= max_rt
-        ]
-
     #  check and (if necessary) convert error_tolerance to absolute (Thomson)
     #  units
     if error_units == "ppm":
@@ -69,13 +71,12 @@ def generate_EIC(
     mass_range = (target_mass - error_tolerance, target_mass + error_tolerance)
 
     #  iterate through spectra, matching masses
-    for spec in ms_data:
+    for retention_time, spec in ms_data:
         matches = match_mass(candidates=spec["mass_list"], range=mass_range)
         if matches:
-            intensity = sum(
-                [float(spec[format(match, ".4f")]) for match in matches]
-            )
-            yield (float(spec["retention_time"]), intensity)
+            #  only the few matched peaks are looked up by their ripper key
+            intensity = sum(float(spec[f"{match:.4f}"]) for match in matches)
+            yield (retention_time, intensity)
 
 
 def generate_chromatogram(
@@ -122,7 +123,9 @@ def generate_chromatogram(
 
 def match_mass(candidates: list, range: tuple) -> list:
     """
-    Matches candidate m/z values to tolerance range.
+    Matches candidate m/z values to tolerance range. Candidates sorted in
+    ascending order, as mzML m/z arrays usually are, are binary searched.
+    Otherwise every candidate is checked.
 
     Args:
         candidates (List[float]): list of candidate m/z values.
@@ -132,11 +135,19 @@ def match_mass(candidates: list, range: tuple) -> list:
     Returns:
         List[float]: list of candidate m/z values that match error tolerance.
     """
-    return [
-        float(mass)
-        for mass in candidates
-        if float(mass) >= range[0] and float(mass) <= range[1]
-    ]
+    #  binary search is only valid on sorted candidates. Sorting an already
+    #  sorted list is a single linear pass in C, far cheaper than the scan
+    if sorted(candidates) != candidates:
+        return [
+            float(mass)
+            for mass in candidates
+            if float(mass) >= range[0] and float(mass) <= range[1]
+        ]
+
+    lower = bisect_left(candidates, range[0])
+    upper = bisect_right(candidates, range[1], lower)
+
+    return [float(mass) for mass in candidates[lower:upper]]
 
 
 def find_max_peak(spectrum: dict) -> tuple:
@@ -150,15 +161,17 @@ def find_max_peak(spectrum: dict) -> tuple:
         Tuple[float, float, float]: most intense peak in format:
             (retention time, m/z, intensity)
     """
-    peaks = sorted(
-        [
-            (float(mass), float(intensity))
-            for mass, intensity in spectrum.items()
-            if mass not in NON_MASS_KEYS
-        ],
-        key=lambda x: x[1],
-    )
-    return (float(spectrum["retention_time"]),) + peaks[-1]
+    peaks = [
+        (mass, float(intensity))
+        for mass, intensity in spectrum.items()
+        if mass not in NON_MASS_KEYS
+    ]
+
+    #  single pass for the most intense peak, iterating in reverse so ties
+    #  resolve to the last peak in the spectrum. Dict views are only
+    #  reversible from Python 3.8 so the peaks are reversed as a list
+    mass, intensity = max(reversed(peaks), key=itemgetter(1))
+    return (float(spectrum["retention_time"]), float(mass), intensity)
 
 
 def sum_intensity_peaks(spectrum: dict) -> tuple:
@@ -173,11 +186,9 @@ def sum_intensity_peaks(spectrum: dict) -> tuple:
         Tuple[float, float]: (retention time, intensity)
     """
     intensity = sum(
-        [
-            float(spectrum[mass])
-            for mass in spectrum
-            if mass not in NON_MASS_KEYS
-        ]
+        float(intensity)
+        for mass, intensity in spectrum.items()
+        if mass not in NON_MASS_KEYS
     )
 
     return (float(spectrum["retention_time"]), intensity)
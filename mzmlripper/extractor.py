@@ -8,15 +8,23 @@ Single processing and bulk processing available.
 .. signature:: dd383a145d9a2425c23afc00c04dc054951b13c76b6138c6373597b9bf55c007
 
 """
-from .mzml_parser import MzmlParser
+import os
+import glob
+from functools import partial
+from typing import Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from .mzml_parser import MzmlParser, DEFAULT_INT_THRESHOLD
 
 
 def process_mzml_file(
     filename: str,
     out_dir: str,
     rt_units=None,
-    int_threshold=1000,
+    int_threshold=DEFAULT_INT_THRESHOLD,
     relative=False,
+    max_workers=1,
+    ms_levels=None,
 ):
     """Constructs a parser for the mzML file and extracts information
 
@@ -29,6 +37,10 @@ def process_mzml_file(
 
     Keyword Arguments:
         int_threshold {int} -- Intensity threshold for peaks (default: {1000})
+        max_workers {int} -- Number of worker processes used to process the
+            spectra, None for one per CPU (default: {1})
+        ms_levels {Iterable[int]} -- MS levels to extract, None for all MS
+            levels (default: {None})
     """
 
     return MzmlParser(
@@ -37,4 +49,73 @@ def process_mzml_file(
         rt_units=rt_units,
         int_threshold=int_threshold,
         relative_intensity=relative,
+        max_workers=max_workers,
+        ms_levels=ms_levels,
     ).parse_file()
+
+
+def _process_file(filename: str, out_dir: str, **kwargs) -> str:
+    """Processes a single mzML file in a worker process
+
+    The ripper data is only written to file and not returned so that it does
+    not have to be sent back to the parent process.
+
+    Arguments:
+        filename {str} -- Name of the mzML file
+        out_dir {str} -- Directory to store the output
+
+    Returns:
+        str -- Name of the processed mzML file
+    """
+
+    process_mzml_file(filename, out_dir, **kwargs)
+    return filename
+
+
+def process_multiple_files(
+    data_folder: str,
+    out_dir: str,
+    rt_units=None,
+    int_threshold=DEFAULT_INT_THRESHOLD,
+    relative=False,
+    max_workers: Optional[int] = None,
+    ms_levels: Optional[Iterable[int]] = None,
+) -> List[str]:
+    """Extracts information from every mzML file in a folder
+
+    Each file is independent so files are processed in parallel, one
+    file per worker process. On platforms that spawn worker processes
+    (Windows, macOS) this must be called from within an
+    `if __name__ == "__main__":` block.
+
+    Arguments:
+        data_folder {str} -- Folder containing the mzML files
+        out_dir {str} -- Directory to store the output
+        rt_units {str} -- Units of mzML file retention times (min or sec)
+        relative {bool} -- Specifies whether ion intensities in final ripper
+            dict are displayed in relative (%) or absolute units.
+
+    Keyword Arguments:
+        int_threshold {int} -- Intensity threshold for peaks (default: {1000})
+        max_workers {int} -- Number of worker processes (default: number of
+            CPUs)
+        ms_levels {Iterable[int]} -- MS levels to extract, None for all MS
+            levels (default: {None})
+
+    Returns:
+        List[str] -- Names of the processed mzML files
+    """
+
+    filenames = sorted(glob.iglob(os.path.join(data_folder, "*.mzML")))
+
+    process_file = partial(
+        _process_file,
+        out_dir=out_dir,
+        rt_units=rt_units,
+        int_threshold=int_threshold,
+        relative=relative,
+        ms_levels=ms_levels,
+    )
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(process_file, filenames))
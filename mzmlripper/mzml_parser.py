@@ -1,5 +1,5 @@
 """Module for parsing mzML files
-Reads file line by line and extracts out all relevant information
+Streams the XML elements of the file and extracts out all relevant information
 Information being MS1 and MS2 spectra data
 
 Extracts:
@@ -20,48 +20,65 @@ Extracts:
 import os
 import re
 import json
-from threading import Thread
-from typing import List, Optional, Dict
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from operator import attrgetter, le
+from typing import Callable, Iterable, List, Optional, Dict
+
+# Optional libxml2 based XML parser, falls back on the standard library
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Optional fast JSON writer, falls back on the standard library if missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Ripper imports
 from .spectrum import Spectrum
 from .logger import make_logger, colour_item
 
-# List of banned phrases to ignore as they can screw with the parsing
-BANNED_PHRASES = ["<userParam"]
+# Default intensity threshold below which peaks are discarded
+DEFAULT_INT_THRESHOLD = 1000
 
+# Numeric retention time of a spectrum, used to sort spectra
+RETENTION_TIME = attrgetter("retention_time_value")
 
-def create_regex_mapper() -> dict:
-    """Creates a mapping of tags to RegEx strings
+# Compiled RegEx search for the scan number within a native ID or title
+SCAN_SEARCH = re.compile(r"scan=([0-9]+)").search
+
+
+def local_name(tag: str) -> str:
+    """Strips the namespace from an element tag
+
+    Arguments:
+        tag {str} -- Element tag, e.g. `{http://psi.hupo.org/ms/mzml}spectrum`
 
     Returns:
-        dict -- Mapping of tags to RegEx
+        str -- Tag without the namespace, e.g. `spectrum`
     """
 
-    return {
-        "spec_index": r'index="(.+?)"',
-        "array_length": r'defaultArrayLength="(.+?)"',
-        "value": r'value="(.+?)"',
-        "name": r'name="(.+?)"',
-        "binary": r"<binary>(.*?)</binary>",
-        "scan": r"scan=([0-9]+)",
-    }
+    return tag.rpartition("}")[2]
 
 
-def value_finder(regex: str, line: str) -> str:
+def value_finder(search: Callable, line: str) -> str:
     """Finds a value using RegEx from a given line
 
     Returns None if nothing found
 
     Arguments:
-        regex {str} -- RegEx string
+        search {Callable} -- Compiled RegEx search method
         line {str} -- Line to parse
 
     Returns:
         str -- Match if found, None if not
     """
 
-    result = re.search(regex, line)
+    result = search(line)
 
     if result:
         return result.group(1)
@@ -71,35 +88,47 @@ def value_finder(regex: str, line: str) -> str:
 def write_json(data: dict, filename: str):
     """Writes data to JSON file
 
+    Uses orjson if it is installed, which serialises the whole output in C,
+    otherwise falls back on the standard library `json` module. Both write
+    the same layout, indented by 2 spaces, as orjson has no other indent.
+    Floats always parse back to the same values, but may be spelled
+    differently, e.g. `0.00001` instead of `1e-05`, and orjson writes NaN
+    and infinite values as `null`.
+
     Arguments:
         data {dict} -- Data to write
         filename {str} -- Name fo the file
     """
 
+    if orjson is not None:
+        # Relative intensity spectra are keyed by floats
+        with open(filename, "wb") as f_d:
+            f_d.write(
+                orjson.dumps(
+                    data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                )
+            )
+        return
+
     with open(filename, "w") as f_d:
-        json.dump(data, f_d, indent=4)
+        json.dump(data, f_d, indent=2)
 
 
-def banned_phrases(line: str) -> bool:
-    """Small check to determine if any banned phrase is in a given line.
-    Banned phrases are phrases that can interfere with the parsing and indicate
-    that the parser should ignore said line.
+def process_spectrum(spec: Spectrum) -> Dict:
+    """Processes a single spectrum in a worker process
 
-    Args:
-        line (str): Line to check
+    Only the serialised data is sent back, the decoded arrays are left behind
+    in the worker.
+
+    Arguments:
+        spec (Spectrum): Spectrum to process
 
     Returns:
-        bool: Banned phrase exists
+        Dict: Serialised spectrum data
     """
 
-    # Iterate through all banned phrases
-    for phrase in BANNED_PHRASES:
-        # Phrase is banned
-        if phrase in line:
-            return True
-
-    # No banned phrases found
-    return False
+    spec.process()
+    return spec.serialized
 
 
 class InvalidInputFile(Exception):
@@ -119,6 +148,12 @@ class MzmlParser:
         relative_intensity (bool, optional): Specifies whether final
             intensities for individual ions in spectra are displayed as
             relative (%) or absolute intensities. Defaults to False.
+        max_workers (int, optional): Number of worker processes used to
+            process the spectra. `None` uses one per CPU. Defaults to 1,
+            processing the spectra in the current process.
+        ms_levels (Iterable[int], optional): MS levels to extract, spectra of
+            any other level are discarded without being processed. Defaults
+            to `None`, extracting all MS levels.
     """
 
     def __init__(
@@ -126,14 +161,14 @@ class MzmlParser:
         filename: str,
         output_dir: str,
         rt_units: Optional[int] = None,
-        int_threshold: Optional[int] = 1000,
+        int_threshold: Optional[int] = DEFAULT_INT_THRESHOLD,
         relative_intensity: Optional[bool] = False,
+        max_workers: Optional[int] = 1,
+        ms_levels: Optional[Iterable[int]] = None,
     ):
         self.logger = make_logger("MzMLRipper")
         self.filename = filename
         self.output_dir = os.path.abspath(output_dir)
-        self.in_spectrum = False
-        self.re_expr = create_regex_mapper()
         self.spectra = []
         self.ms = {}
 
@@ -143,7 +178,25 @@ class MzmlParser:
         self.relative = relative_intensity
         self.spec_int_threshold = int_threshold
         self.curr_spec_bin_type = -1
+        self.curr_spec_d_type = ""
         self.rt_units = rt_units
+        self.max_workers = max_workers
+        self.ms_levels = None if ms_levels is None else frozenset(ms_levels)
+
+        # Handlers for each cvParam accession of interest, along with the
+        # attribute of the cvParam holding the value to pass on
+        self.cv_param_handlers = {
+            "MS:1000511": (self._set_ms_level, "value"),
+            "MS:1000796": (self._set_scan, "value"),
+            "MS:1000016": (self._set_retention_time, "value"),
+            "MS:1000512": (self._set_hcd, "value"),
+            "MS:1000521": (self._set_d_type, "name"),
+            "MS:1000523": (self._set_d_type, "name"),
+            "MS:1000574": (self._set_compression, "name"),
+            "MS:1000744": (self._set_parent_mass, "value"),
+            "MS:1000514": (self._set_binary_type, "accession"),
+            "MS:1000515": (self._set_binary_type, "accession"),
+        }
 
     def _check_file(self):
         """Checks if a file is valid for the parser
@@ -159,7 +212,7 @@ class MzmlParser:
             raise InvalidInputFile(f"File {self.filename} is not valid!")
 
     def parse_file(self) -> Dict:
-        """Reads the file line by line and obtains all information
+        """Walks the XML tree of the file and obtains all information
 
         Data is then bulk processed by MS level
 
@@ -170,13 +223,10 @@ class MzmlParser:
         # CHeck the file exists and is an MzML file
         self._check_file()
 
-        # Open the file and process each line individually
-        with open(self.filename) as f_d:
-            self.logger.info(
-                f"Parsing file: {colour_item(self.filename, 'yellow')}..."
-            )
-            for line in f_d.readlines():
-                self.process_line(line)
+        self.logger.info(
+            f"Parsing file: {colour_item(self.filename, 'yellow')}..."
+        )
+        self.walk_tree()
 
         self.logger.info(
             f"Parsing complete!\nTotal Spectra:\
@@ -184,11 +234,12 @@ class MzmlParser:
         )
         self.logger.info("Processing spectra...")
 
-        # Get all MS level spectra from the collection
-        ms_levels = [
-            [spec for spec in self.spectra if spec.ms_level == str(level)]
-            for level in range(1, max(map(int, list(self.ms.keys()))) + 1)
-        ]
+        # Bucket the spectra by MS level in a single pass, skipping any
+        # spectra without an MS level
+        ms_levels = [[] for _ in range(max(self.ms, default=0))]
+        for spec in self.spectra:
+            if spec.ms_level > 0:
+                ms_levels[spec.ms_level - 1].append(spec)
 
         # Process and write out to file
         self.bulk_process(*ms_levels)
@@ -198,18 +249,39 @@ class MzmlParser:
         return output
 
     def bulk_process(self, *ms_levels: List[Spectrum]):
-        """Creates threads for processing MS1 and MS2 data simultaneously
+        """Processes the spectra of each MS level in turn
+
+        Processing is CPU bound Python work so it is spread over worker
+        processes rather than threads, which would only contend for the GIL.
+        Spectra are sent to the workers in chunks regardless of MS level so
+        the work is balanced between workers. Every chunk is submitted up
+        front, so all of the spectra are queued for the workers at once. On
+        platforms that spawn worker processes (Windows, macOS) this must be
+        run from within an `if __name__ == "__main__":` block.
 
         Arguments:
             ms_levels (List[Spectrum]): Collection of MS spectra
         """
 
-        pool = [
-            Thread(target=self.process_spectra, args=(ms,)) for ms in ms_levels
-        ]
+        if self.max_workers == 1:
+            for ms in ms_levels:
+                self.process_spectra(ms)
+            return
 
-        [thread.start() for thread in pool]
-        [thread.join() for thread in pool]
+        spectra = list(chain.from_iterable(ms_levels))
+        workers = self.max_workers or os.cpu_count() or 1
+        chunk_size = max(1, len(spectra) // (workers * 4))
+
+        # Serialised data is sent back in the order of the spectra and stored
+        # on the original spectra, whose Base64 text is then freed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for spec, serialized in zip(
+                spectra,
+                executor.map(process_spectrum, spectra, chunksize=chunk_size),
+            ):
+                spec.serialized = serialized
+                spec.mz = spec.intensity = ""
+                self.ms[spec.ms_level].append(spec)
 
     def process_spectra(self, spectra: List[Spectrum]):
         """Processes spectra from a list and serialises the data
@@ -232,21 +304,24 @@ class MzmlParser:
         # Create the output
         output = {"ms" + str(x): {} for x in self.ms.keys()}
 
-        # Sort the MS spectra by retention time
-        for ms_level in self.ms:
-            self.ms[ms_level] = sorted(
-                self.ms[ms_level], key=lambda x: x.retention_time
-            )
+        # Sort the MS spectra by retention time, spectra are usually written
+        # in acquisition order so only sort if they are out of order
+        for spectra in self.ms.values():
+            retention_times = list(map(RETENTION_TIME, spectra))
+            if not all(map(le, retention_times, retention_times[1:])):
+                spectra.sort(key=RETENTION_TIME)
 
-        # Populate the output
+        # Populate the output, numbering spectra by their position in the
+        # sorted list so spectra without any masses leave a gap
         for ms_level in sorted(list(self.ms.keys())):
-            for pos, spec in enumerate(self.ms[ms_level]):
+            for spec in self.ms[ms_level]:
                 if not spec.serialized:
                     spec.process()
-                if spec.serialized["mass_list"]:
-                    output["ms" + ms_level][
-                        f"spectrum_{pos+1}"
-                    ] = spec.serialized
+            output["ms" + str(ms_level)] = {
+                f"spectrum_{pos}": spec.serialized
+                for pos, spec in enumerate(self.ms[ms_level], 1)
+                if spec.serialized["mass_list"]
+            }
 
         return output
 
@@ -262,178 +337,265 @@ class MzmlParser:
 
         output = self.build_output()
 
-        name = self.filename.split(os.sep)[-1]
-
-        name = "ripper_" + name
-        out_path = os.path.join(
-            self.output_dir, name.replace(".mzML", ".json")
-        )
+        stem, _ = os.path.splitext(os.path.basename(self.filename))
+        out_path = os.path.join(self.output_dir, f"ripper_{stem}.json")
 
-        if not os.path.exists(os.path.dirname(out_path)):
-            os.makedirs(os.path.dirname(out_path))
+        os.makedirs(self.output_dir, exist_ok=True)
         write_json(output, out_path)
 
         return output
 
-    def process_line(self, line: str):
-        """Processes a line from mzML
+    def walk_tree(self):
+        """Streams the XML elements of the file and extracts each spectrum
 
-        Checks if we are in a spectrum or not
-        If we're not in a spectrum, check for spectrum tag and pull information
+        Each spectrum (and chromatogram) is freed from the tree once it has
+        been handled so only the current element is ever held in memory.
+        Uses lxml if it is installed, otherwise the standard library parser.
+        """
 
-        Continuously check if we've reached the end tag of the spectrum and
-        add the spectrum to a list
+        if etree is not None:
+            self._walk_tree_lxml()
+        else:
+            self._walk_tree_stdlib()
 
-        If we're in a spectrum and not reached the end tag,
-        check and pull relevant information
+    def _walk_tree_lxml(self):
+        """Streams the spectra and chromatograms of the file using lxml
 
-        Arguments:
-            line {str} -- Line form mzML
+        Only the end events of the tags of interest are reported back to
+        Python, all other elements are handled by libxml2.
         """
 
-        # Currently not in a spectrum, set the spectrum flag
-        if not self.in_spectrum:
-            self.start_spectrum(line)
+        for _, element in etree.iterparse(
+            self.filename,
+            events=("end",),
+            tag=("{*}spectrum", "{*}chromatogram"),
+            remove_comments=True,
+            remove_pis=True,
+            huge_tree=True,
+        ):
+            if local_name(element.tag) == "spectrum":
+                self.extract_spectrum(element)
 
-        # Look for end of spectrum tag
-        else:
-            if "</spectrum>" in line:
-                self.spectra.append(self.spec)
-                self.in_spectrum = False
-                self.spec = Spectrum(
-                    intensity_threshold=self.spec_int_threshold,
-                    relative=self.relative,
-                )
-            else:
-                if banned_phrases(line):
-                    return
+            # Free the element and any handled siblings before it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
 
-                self.extract_information(line)
+    def _walk_tree_stdlib(self):
+        """Streams the spectra and chromatograms of the file using the
+        standard library `xml.etree.ElementTree` parser
+        """
 
-    def start_spectrum(self, line: str):
-        """Initiates the spectrum data gathering process
+        # Parent of the elements currently being streamed
+        parent = None
+        extract_spectrum = self.extract_spectrum
 
-        Check we get a match for spectrum index tag
-        If not, we've got junk and just return
-        If we are, extract all information from that line
+        for event, element in ET.iterparse(
+            self.filename, events=("start", "end")
+        ):
+            tag = local_name(element.tag)
 
-        Arguments:
-            line (str): Line from mzML
-        """
+            # Keep hold of the list so handled elements can be removed
+            if event == "start":
+                if tag in ("spectrumList", "chromatogramList"):
+                    parent = element
+                continue
 
-        # Extract the spectrum ID
-        spec_id = value_finder(self.re_expr["spec_index"], line)
-        if not spec_id:
-            return
+            if tag == "spectrum":
+                extract_spectrum(element)
 
-        # Set the flag and ID
-        self.in_spectrum = True
-        self.spec.id = spec_id
+            elif tag != "chromatogram":
+                continue
 
-        # Find the size of the data array
-        self.spec.array_length = value_finder(
-            self.re_expr["array_length"], line
-        )
+            element.clear()
+            if parent is not None:
+                parent.remove(element)
 
-    def extract_information(self, line: str):
-        """Attempts to extract information from a given line
+    def extract_spectrum(self, element: ET.Element):
+        """Extracts all information from a spectrum element
 
         Information here:
+        Spectrum index and array length
+        MS level and scan number
         Retention Time
+        Parent masses and scans
         32 or 64 bit data
         Type of compression
         MZ data
         Intensity Data
 
         Arguments:
-            line (str): Line from mzML
+            element (ET.Element): Spectrum element from mzML
 
         Raises:
             Exception: Unable to determine what kind of binary data
             we're looking at.
         """
 
-        # MS Level
-        if "MS:1000511" in line:
-            self.spec.ms_level = value_finder(self.re_expr["value"], line)
-            if self.spec.ms_level not in self.ms:
-                self.ms[self.spec.ms_level] = []
-
-        # Scan Number
-        elif "MS:1000796" in line:
-            self.spec.scan = value_finder(self.re_expr["scan"], line)
-
-        # Retention time
-        elif "MS:1000016" in line:
-            rt_converter = 1
-            if self.rt_units == "sec":
-                rt_converter = 60
-            self.spec.retention_time = str(
-                float(value_finder(self.re_expr["value"], line)) / rt_converter
-            )
+        self.spec = Spectrum(
+            intensity_threshold=self.spec_int_threshold,
+            relative=self.relative,
+        )
 
-        # Fragmentation energy
-        elif "MS:1000512" in line:
-            self.spec.hcd = (
-                value_finder(self.re_expr["value"], line)
-                .split("hcd")[-1]
-                .split(" ")[0]
-            )
+        # Set the ID and the size of the data array
+        self.spec.id = element.get("index")
+        self.spec.array_length = element.get("defaultArrayLength")
 
-        # Data type (32 or 64 bit)
-        elif "MS:1000521" in line or "MS:1000523" in line:
-            self.spec.d_type = value_finder(self.re_expr["name"], line)
+        # Bind the lookups used for every child element to locals
+        get_handler = self.cv_param_handlers.get
+        set_parent_scan = self._set_parent_scan
+        set_binary = self._set_binary
 
-        # Compression type
-        elif "MS:1000574" in line:
-            self.spec.compression = value_finder(self.re_expr["name"], line)
+        # Child elements are visited in document order so the binary type is
+        # always set before the binary data it describes
+        for child in element.iter():
+            tag = local_name(child.tag)
 
-        # Parent mass
-        elif "MS:1000744" in line:
-            self.spec.parent_mass = value_finder(self.re_expr["value"], line)
-            self.spec.precursors.append(
-                value_finder(self.re_expr["value"], line)
-            )
+            if tag == "cvParam":
+                handler = get_handler(child.get("accession"))
+                if handler:
+                    set_value, attribute = handler
+                    set_value(child.get(attribute, ""))
 
-        # Parent Scan
-        elif "<precursor spectrumRef" in line:
-            self.spec.parent_scan = value_finder(self.re_expr["scan"], line)
-            self.spec.precursors_scans.append(
-                value_finder(self.re_expr["scan"], line)
-            )
+            elif tag == "precursor":
+                spectrum_ref = child.get("spectrumRef")
+                if spectrum_ref is not None:
+                    set_parent_scan(value_finder(SCAN_SEARCH, spectrum_ref))
+
+            elif tag == "binary":
+                set_binary(child.text or "")
+
+        if self.is_wanted_level(self.spec.ms_level):
+            self.spectra.append(self.spec)
 
-        # Suggested parent mass
-        elif "MS:1000512" in line:
-            suggested_parent = value_finder(self.re_expr["value"], line)
-            self.update_parent(suggested_parent)
+    def is_wanted_level(self, ms_level: int) -> bool:
+        """Checks if spectra of a given MS level are to be extracted
 
-        # MZ data
-        elif "MS:1000514" in line:
-            self.curr_spec_bin_type = 0
+        Arguments:
+            ms_level (int): MS level
+
+        Returns:
+            bool: MS level is to be extracted
+        """
 
-        # Intensity data
-        elif "MS:1000515" in line:
-            self.curr_spec_bin_type = 1
+        return self.ms_levels is None or ms_level in self.ms_levels
 
-        # Binary blob
-        elif "<binary>" in line:
-            binary_text = value_finder(self.re_expr["binary"], line)
+    def _set_ms_level(self, value: str):
+        """Sets the MS level of the current spectrum
 
-            # Looking at MZ values
-            if self.curr_spec_bin_type == 0:
-                self.spec.mz = binary_text
+        Arguments:
+            value (str): MS level
+        """
 
-            # Looking at intensity values
-            elif self.curr_spec_bin_type == 1:
-                self.spec.intensity = binary_text
+        self.spec.ms_level = int(value)
+        if self.spec.ms_level not in self.ms and self.is_wanted_level(
+            self.spec.ms_level
+        ):
+            self.ms[self.spec.ms_level] = []
 
-            # No idea what we're looking at
-            else:
-                raise Exception("Error setting binary type")
+    def _set_scan(self, value: str):
+        """Sets the scan number of the current spectrum
 
-        # Nothing
+        Arguments:
+            value (str): Spectrum title containing the scan number
+        """
+
+        self.spec.scan = value_finder(SCAN_SEARCH, value)
+
+    def _set_retention_time(self, value: str):
+        """Sets the retention time of the current spectrum
+
+        Arguments:
+            value (str): Retention time in the units of the mzML file
+        """
+
+        rt_converter = 1
+        if self.rt_units == "sec":
+            rt_converter = 60
+        self.spec.retention_time_value = float(value) / rt_converter
+        self.spec.retention_time = str(self.spec.retention_time_value)
+
+    def _set_hcd(self, value: str):
+        """Sets the fragmentation energy from the filter string
+
+        Arguments:
+            value (str): Filter string
+        """
+
+        self.spec.hcd = value.split("hcd")[-1].split(" ")[0]
+
+    def _set_d_type(self, value: str):
+        """Sets the data type (32 or 64 bit) of the next binary blob
+
+        Arguments:
+            value (str): Data type name
+        """
+
+        self.curr_spec_d_type = value
+
+    def _set_compression(self, value: str):
+        """Sets the compression type of the binary data
+
+        Arguments:
+            value (str): Compression type name
+        """
+
+        self.spec.compression = value
+
+    def _set_parent_mass(self, value: str):
+        """Sets the parent mass and adds it to the list of precursors
+
+        Arguments:
+            value (str): Selected ion m/z
+        """
+
+        self.spec.parent_mass = value
+        self.spec.precursors.append(value)
+
+    def _set_parent_scan(self, value: str):
+        """Sets the parent scan and adds it to the list of precursor scans
+
+        Arguments:
+            value (str): Scan number of the precursor spectrum
+        """
+
+        self.spec.parent_scan = value
+        self.spec.precursors_scans.append(value)
+
+    def _set_binary_type(self, value: str):
+        """Sets whether the next binary blob holds MZ or intensity data
+
+        Arguments:
+            value (str): Array accession, MS:1000514 for the MZ array and
+                MS:1000515 for the intensity array
+        """
+
+        self.curr_spec_bin_type = 0 if value == "MS:1000514" else 1
+
+    def _set_binary(self, binary_text: str):
+        """Sets the MZ or intensity binary data of the current spectrum
+
+        Arguments:
+            binary_text (str): Base64 encoded binary data
+
+        Raises:
+            Exception: Unable to determine what kind of binary data
+            we're looking at.
+        """
+
+        # Looking at MZ values
+        if self.curr_spec_bin_type == 0:
+            self.spec.mz = binary_text
+            self.spec.mz_d_type = self.curr_spec_d_type
+
+        # Looking at intensity values
+        elif self.curr_spec_bin_type == 1:
+            self.spec.intensity = binary_text
+            self.spec.intensity_d_type = self.curr_spec_d_type
+
+        # No idea what we're looking at
         else:
-            return
+            raise Exception("Error setting binary type")
 
     def update_parent(self, filter_string: str):
         """Updates the parent for MS3 and above
@@ -443,12 +605,12 @@ class MzmlParser:
         """
 
         # Below MS level 3
-        if int(self.spec.ms_level) < 3:
+        if self.spec.ms_level < 3:
             return
 
         # Sets the parent for MS levels 3 and above
         parents = filter_string.split("@")
-        self.spec.parent_mass = parents[int(self.spec.ms_level) - 2].split(
+        self.spec.parent_mass = parents[self.spec.ms_level - 2].split(
             " "
         )[-1]
         # if self.spec.ms_level == "3":
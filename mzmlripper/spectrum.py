@@ -8,14 +8,43 @@ Raw information is then decoded and serialised into a dictionary
 """
 
 # System imports
+import sys
 import zlib
-import struct
-import base64
+import array
+from itertools import compress
+from operator import itemgetter
 from typing import Dict
 
-#  list of spectrum keys that do not correspond to individual ions with specific
+# Optional SIMD Base64 decoder, falls back on the standard library if missing
+try:
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+# Optional libdeflate bindings, falls back on the standard library if missing
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+# Size in bytes of the largest supported data type (64-bit float)
+MAX_ITEM_SIZE = 8
+
+#  set of spectrum keys that do not correspond to individual ions with specific
 #  m/z and intensity values
-NON_MASS_KEYS = ["mass_list", "retention_time", "parent", "scan", "parent_scan", "hcd"]
+NON_MASS_KEYS = frozenset([
+    "mass_list",
+    "retention_time",
+    "parent",
+    "precursors",
+    "scan",
+    "parent_scan",
+    "precursors_scans",
+    "hcd",
+    "HCD",
+    "base_peak",
+    "splash",
+])
 
 
 class UnsupportedCompressionMethod(Exception):
@@ -23,6 +52,11 @@ class UnsupportedCompressionMethod(Exception):
     """
 
 
+class ArrayLengthMismatch(Exception):
+    """Decoded binary data does not hold the expected number of values
+    """
+
+
 class Spectrum(object):
     """Class for representing a Spectrum object from mzML
 
@@ -33,16 +67,42 @@ class Spectrum(object):
             ions in spectra are displayed in relative (%) or absolute units.
     """
 
+    # Fixed attributes keep the per spectrum memory down on large files
+    __slots__ = (
+        "id",
+        "scan",
+        "array_length",
+        "ms_level",
+        "precursors",
+        "precursors_scans",
+        "parent_mass",
+        "parent_scan",
+        "retention_time",
+        "retention_time_value",
+        "mz_d_type",
+        "intensity_d_type",
+        "compression",
+        "mz",
+        "intensity",
+        "hcd",
+        "serialized",
+        "intensity_threshold",
+        "relative",
+    )
+
     def __init__(self, intensity_threshold, relative=False):
+        self.id = ""
         self.scan = ""
         self.array_length = ""
-        self.ms_level = ""
+        self.ms_level = 0
         self.precursors = []
         self.precursors_scans = []
         self.parent_mass = ""
         self.parent_scan = ""
         self.retention_time = ""
-        self.d_type = ""
+        self.retention_time_value = 0.0
+        self.mz_d_type = ""
+        self.intensity_d_type = ""
         self.compression = ""
         self.mz = ""
         self.intensity = ""
@@ -50,16 +110,34 @@ class Spectrum(object):
         self.serialized = {}
         self.intensity_threshold = intensity_threshold
         self.relative = relative
-        self.hcd = ""
 
     def _set_data_type(self):
         """Sets the data type of the binary data within
+
+        The MZ and intensity arrays each have their own data type, e.g. 64-bit
+        MZ values alongside 32-bit intensities
+        """
+
+        self.mz_d_type = self._data_type_code(self.mz_d_type)
+        self.intensity_d_type = self._data_type_code(self.intensity_d_type)
+
+    @staticmethod
+    def _data_type_code(d_type: str) -> str:
+        """Converts a binary data type name to its array type code
+
+        Arguments:
+            d_type (str): Data type name, e.g. `64-bit float`
+
+        Returns:
+            str: `f` for 32-bit floats, `d` for 64-bit floats or the name
+                unchanged if neither
         """
 
-        if "32" in self.d_type:
-            self.d_type = "f"
-        elif "64" in self.d_type:
-            self.d_type = "d"
+        if "32" in d_type:
+            return "f"
+        elif "64" in d_type:
+            return "d"
+        return d_type
 
     def process(self):
         """Processes a Spectrum
@@ -75,41 +153,61 @@ class Spectrum(object):
     def decode_and_decompress(self):
         """Decodes binary data from Base64 and decompresses if necessary
 
-        Converts the binary data to a list of floats
+        Converts the binary data to an array of floats. Each array is fully
+        decoded before the next so only one array's intermediate buffers are
+        alive at a time, and they are freed as soon as the array is built
         """
 
-        # Decode the MZ and intensity data
-        self.mz = base64.b64decode(self.mz)
-        self.intensity = base64.b64decode(self.intensity)
-
-        # Using ZLib compression
-        if "zlib" in self.compression:
-            self.mz = self.decompress(self.mz)
-            self.intensity = self.decompress(self.intensity)
-        else:
+        # Only ZLib compression is supported
+        if "zlib" not in self.compression:
             raise UnsupportedCompressionMethod(
                 f"Compression method {self.compression} is not supported."
             )
 
-        # Build the MZ array
-        self.mz = list(
-            struct.unpack(
-                f"<{self.array_length}{self.d_type}",
-                self.mz
-            )
+        # Build the MZ and intensity arrays, releasing the Base64 text
+        self.mz = self.build_array(
+            self.decompress(b64decode(self.mz)), self.mz_d_type
+        )
+        self.intensity = self.build_array(
+            self.decompress(b64decode(self.intensity)), self.intensity_d_type
         )
 
-        # Build the Intensity array
-        self.intensity = list(
-            struct.unpack(
-                f"<{self.array_length}{self.d_type}",
-                self.intensity
+    def build_array(self, stream: bytes, d_type: str) -> array.array:
+        """
+        Builds an array of floats directly from a decompressed data stream.
+        Args:
+            stream (bytes): decompressed data stream.
+            d_type (str): array type code, `f` or `d`.
+
+        Returns:
+            array.array: array of 32 or 64 bit floats.
+
+        Raises:
+            ArrayLengthMismatch: the stream does not hold exactly the array
+                length of the spectrum.
+        """
+
+        # Copy the raw buffer into the array in one go
+        values = array.array(d_type)
+        if self.array_length and (
+            len(stream) != int(self.array_length) * values.itemsize
+        ):
+            raise ArrayLengthMismatch(
+                f"Expected {self.array_length} values of type {d_type}, got"
+                f" {len(stream)} bytes."
             )
-        )
+        values.frombytes(stream)
+
+        # Binary data in mzML is little endian
+        if sys.byteorder == "big":
+            values.byteswap()
+
+        return values
 
     def decompress(self, stream: bytes):
         """
-        Decompresses a data stream using a zlib decompression object.
+        Decompresses a data stream using libdeflate if it is installed, or
+        otherwise a zlib decompression object.
         Args:
             stream (bytes): data stream.
 
@@ -117,6 +215,17 @@ class Spectrum(object):
             bytes: decompressed data stream.
         """
 
+        # The array length bounds the decompressed size, so libdeflate can
+        # decompress in one shot. Anything it rejects, such as a truncated
+        # stream, is left to zlib
+        if deflate is not None and self.array_length:
+            try:
+                return deflate.zlib_decompress(
+                    stream, int(self.array_length) * MAX_ITEM_SIZE
+                )
+            except deflate.DeflateError:
+                pass
+
         # Decompress the ZLib stream
         zobj = zlib.decompressobj()
         stream = zobj.decompress(stream)
@@ -131,22 +240,23 @@ class Spectrum(object):
             Dict: Spectrum data
         """
 
-        out = {}
-        mass_list = []
+        # Intensity threshold for MS 1, or the lower threshold for MS 2+
+        if self.ms_level == 1:
+            threshold = self.intensity_threshold
+        elif self.ms_level > 1:
+            threshold = (self.intensity_threshold / 100) * 5
+        else:
+            threshold = float("inf")
+
+        # Mask of the intensities meeting the threshold, built at C level
+        above = list(map(float(threshold).__lt__, self.intensity))
 
-        # Iterate through the MZ and intensity
-        for mz, intensity in zip(self.mz, self.intensity):
-            # Check the intensity threshold is met and add to output
-            if self.ms_level == "1":
-                if intensity > self.intensity_threshold:
-                    out[f"{mz:.4f}"] = int(intensity)
-                    mass_list.append(mz)
+        # Format each mass meeting the threshold once, for both its key and
+        # its entry in the mass list
+        masses = [f"{mz:.4f}" for mz in compress(self.mz, above)]
 
-            # Check the intensity threshold is met and add to output for MS 2
-            elif self.ms_level > "1":
-                if intensity > (self.intensity_threshold / 100) * 5:
-                    out[f"{mz:.4f}"] = int(intensity)
-                    mass_list.append(mz)
+        # Add the ions meeting the threshold to the output
+        out = dict(zip(masses, map(int, compress(self.intensity, above))))
 
         # Populate remaining data
         out["retention_time"] = self.retention_time
@@ -180,7 +290,7 @@ class Spectrum(object):
             out["HCD"] = self.hcd
 
         # Create mass list
-        out["mass_list"] = [float(f"{mass:.4f}") for mass in mass_list]
+        out["mass_list"] = list(map(float, masses))
 
         #  if relative intensities are to be returned, convert spectrum dict
         if self.relative:
@@ -196,14 +306,15 @@ class Spectrum(object):
         Returns:
             Dict: Spectrum data
         """
-        #  get list of ions ([[m/z, I], ...]) sorted by intensity
-        all_ions = sorted([
-            [float(mass), float(intensity)]
-            for mass, intensity in spectrum_dict.items()
-            if mass not in NON_MASS_KEYS], key=lambda x: x[1])
-
-        #  get the base peak - most intense ion
-        base_peak = all_ions[-1]
+        #  get list of ions ([(m/z, I), ...]) sorted by intensity
+        all_ions = sorted(
+            [
+                (float(mass), float(intensity))
+                for mass, intensity in spectrum_dict.items()
+                if mass not in NON_MASS_KEYS
+            ],
+            key=itemgetter(1),
+        )
 
         #  make sure all NON_MASS_KEYS remain unchanged in spectrum_dict
         spectrum_dict = {
@@ -211,10 +322,19 @@ class Spectrum(object):
             if key in NON_MASS_KEYS
         }
 
-        #  iterate through ions, readding to spectrum_dict with relative
-        #  intensities
-        for ion in all_ions:
-            spectrum_dict[ion[0]] = round((ion[1] / base_peak[1]) * 100, 4)
+        #  no ions above the threshold, so there is no base peak
+        if not all_ions:
+            return spectrum_dict
+
+        #  get the base peak - most intense ion
+        base_peak = list(all_ions[-1])
+        base_intensity = base_peak[1]
+
+        #  readd ions to spectrum_dict with relative intensities
+        spectrum_dict.update(
+            (mass, round((intensity / base_intensity) * 100, 4))
+            for mass, intensity in all_ions
+        )
         spectrum_dict["base_peak"] = base_peak
 
         return spectrum_dict
@@ -6,10 +6,18 @@
 
 """
 
+import threading
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+)
 from .logger import make_logger, colour_item
+from .spectrum import NON_MASS_KEYS
 from typing import Dict, Optional, List, Tuple
 
 SLAPSH_API_URL = "https://splash.fiehnlab.ucdavis.edu/splash/it"
+# Number of requests sent to the SPLASH web API at the same time, kept low
+# as it is a public service
+API_MAX_WORKERS = 4
 LOGGER = make_logger("PySPLASH")
 
 def _initSPLASHpackage():
@@ -58,9 +66,33 @@ def _initSPLASHpackage():
 IMPLEMENTATION = _initSPLASHpackage()
 if IMPLEMENTATION == "pySPLASH":
     from splash import Spectrum, SpectrumType, Splash
+
+    # A single hasher is reused for every spectra
+    SPLASHER = Splash()
 elif IMPLEMENTATION == "webAPI":
     import requests
 
+# One HTTP session per thread so connections to the web API are kept alive
+_SESSIONS = threading.local()
+
+
+def _get_session():
+    """ Returns the HTTP session of the current thread, creating it on first
+    use. Sessions are not shared between threads as requests does not
+    guarantee that they are thread safe.
+
+    Returns:
+        requests.Session: HTTP session for the current thread
+    """
+
+    session = getattr(_SESSIONS, "session", None)
+    if session is None:
+        session = requests.Session()
+        _SESSIONS.session = session
+
+    return session
+
+
 def prepare_individual_spectra_for_splashAPI(
     spectra_dict: Dict, mslevel: Optional[int] = -1
 ) -> Dict:
@@ -75,17 +107,15 @@ def prepare_individual_spectra_for_splashAPI(
 
     # This will be returned. See the link above for information on formatting
     spectra_json = {}
-    ion_list = []  # This will be put in the spectra_json dict above
 
-    # Get the masses from the ripper dictionary
-    masses = spectra_dict["mass_list"]
+    # Run through the ions of the ripper dictionary, adding a dictionary that
+    # maps mass to the mass and intensity to intensity for each
+    ion_list = [
+        {"mass": float(mass), "intensity": intensity}
+        for mass, intensity in spectra_dict.items()
+        if mass not in NON_MASS_KEYS
+    ]
 
-    # Run through the masses to get intensities
-    for mass in masses:
-        # Get the intensity for this mass
-        intensity = spectra_dict[f"{mass:.4f}"]
-        # Add a dictionary that maps mass to the mass and intensity to intensity
-        ion_list.append({"mass": mass, "intensity": intensity})
     # Store the list of ion dicts as an element in the json
     spectra_json["ions"] = ion_list
     # Remind the SPLASH that this is MS data
@@ -107,8 +137,9 @@ def get_SPLASH_from_restAPI(spectra_json: Dict) -> str:
     splash_string = None
 
     # Make the request (note, we need to use 'post' not 'get'
-    #  and we need to pass a json arg, not a params arg)
-    response = requests.post(url=SLAPSH_API_URL, json=spectra_json)
+    #  and we need to pass a json arg, not a params arg). The thread's session
+    #  reuses its connection rather than opening a new one for every spectra
+    response = _get_session().post(url=SLAPSH_API_URL, json=spectra_json)
     # Check the response code. 200 is success anything else is shit.
     if response.status_code == 200:
         splash_string = response.content.decode()
@@ -135,16 +166,13 @@ def prepare_individual_spectra_for_pySPLASH(
         List[Tuple[float, float]]: List of mass and intensity values
     """
 
-    ion_list = []  # This list will contain tuples of (mass, intensity)
-    # Get the masses from the ripper dictionary
-    masses = spectra_dict["mass_list"]
-
-    # Run through the masses to get intensities
-    for mass in masses:
-        # Get the intensity for this mass
-        intensity = spectra_dict[f"{mass:.4f}"]
-        # Add a dictionary that maps mass to the mass and intensity to intensity
-        ion_list.append((mass, intensity))
+    # Run through the ions of the ripper dictionary, this list will contain
+    # tuples of (mass, intensity)
+    ion_list = [
+        (float(mass), intensity)
+        for mass, intensity in spectra_dict.items()
+        if mass not in NON_MASS_KEYS
+    ]
 
     # return the formatted data
     return ion_list
@@ -160,91 +188,186 @@ def get_SPLASH_from_pySPLASH(ion_list: List[Tuple[float, float]]) -> str:
     # Initialize the return
     splash_string = None
     spectra = Spectrum(ion_list, SpectrumType.MS)
-    splash_string = Splash().splash(spectra)
+    splash_string = SPLASHER.splash(spectra)
 
     return splash_string
 
-def APIsplash_all_spectra(ripper_dict: Dict) -> Dict:
+
+def _splash_from_restAPI(spectra: Tuple[Dict, str]) -> str:
+    """ Prepares a single ripper spectra and gets its SPLASH from the REST API
+
+    Args:
+        spectra (Tuple[Dict, str]): Spectra information and its MS level
+
+    Returns:
+        str: SPLASH of the spectra
+    """
+
+    this_spectra, mslevel = spectra
+    return get_SPLASH_from_restAPI(
+        prepare_individual_spectra_for_splashAPI(this_spectra, mslevel)
+    )
+
+
+def _ion_fingerprint(spectra_dict: Dict) -> Tuple:
+    """ Returns the ions of a ripper spectra as a hashable key. Spectra with
+    the same ions have the same SPLASH, so they share a key
+
+    Args:
+        spectra_dict (Dict): Spectra information
+
+    Returns:
+        Tuple: Masses and intensities of the ions in the spectra
+    """
+
+    return tuple(
+        (mass, intensity)
+        for mass, intensity in spectra_dict.items()
+        if mass not in NON_MASS_KEYS
+    )
+
+
+def _unique_spectra(ripper_dict: Dict) -> Tuple[List, Dict]:
+    """ Groups every spectra of a ripper dict by its ions so identical spectra
+    are only SPLASHed once
+
+    Args:
+        ripper_dict (Dict): Ripper information
+
+    Returns:
+        Tuple[List, Dict]: Every spectra along with its fingerprint, and the
+            first spectra and mslevel found for each fingerprint
+    """
+
+    all_spectra = []
+    unique = {}
+    for mslevel, spectra in ripper_dict.items():
+        for this_spectra in spectra.values():
+            fingerprint = _ion_fingerprint(this_spectra)
+            all_spectra.append((this_spectra, fingerprint))
+            unique.setdefault(fingerprint, (this_spectra, mslevel))
+
+    return all_spectra, unique
+
+
+def APIsplash_all_spectra(
+    ripper_dict: Dict, max_workers: Optional[int] = API_MAX_WORKERS
+) -> Dict:
     """ This function will get a SPLASH for every spectra in a ripper dict
     This might be kind of slow since we're querying an API for all of them
     Consider selecting spectra in a smarter way
 
+    The requests are I/O bound so they are sent from several threads at once.
+    Spectra with identical ions are only sent once, and no further requests
+    are sent once one has failed
+
     This returns the ripper dict except that each spectra will now have an
     associated 'splash' entry
 
     Args:
         ripper_dict (Dict): Ripper information
+        max_workers (int, optional): Number of requests to send at the same
+            time. Defaults to API_MAX_WORKERS.
 
     Returns:
         Dict: Ripper information with splash helper functions
     """
 
-    # Iterate through all the mslevels
-    all_mslevels = ripper_dict.keys()
-    for mslevel in all_mslevels:
-        # Iterate through all the spectra
-        all_spectra = ripper_dict[mslevel].keys()
-        for spectra in all_spectra:
-            # Grab the spectra
-            this_spectra = ripper_dict[mslevel][spectra]
-            # Convert that to the right format to SPLASH it
-            spectra_json = prepare_individual_spectra_for_splashAPI(
-                this_spectra, mslevel)
-            # SPLASH it
-            splash_string = get_SPLASH_from_restAPI(spectra_json)
-            # Assign add this to the rippper dict
-            this_spectra["splash"] = splash_string
-            ripper_dict[mslevel][spectra] = this_spectra
+    # Grab every spectra, along with one spectra and mslevel per set of ions
+    all_spectra, unique = _unique_spectra(ripper_dict)
+
+    # SPLASH them, keeping track of which set of ions each request is for
+    splash_strings = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_splash_from_restAPI, spectra): fingerprint
+            for fingerprint, spectra in unique.items()
+        }
+
+        try:
+            for future in as_completed(futures):
+                splash_strings[futures[future]] = future.result()
+
+        # Cancel the requests not yet sent rather than waiting on all of them
+        # before the error is raised
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    # Assign add these to the rippper dict
+    for this_spectra, fingerprint in all_spectra:
+        this_spectra["splash"] = splash_strings[fingerprint]
 
     return ripper_dict
 
 
-def pySPLASH_all_spectra(ripper_dict: Dict) -> Dict:
+def pySPLASH_all_spectra(
+    ripper_dict: Dict, max_workers: Optional[int] = 1
+) -> Dict:
     """ This function will get a SPLASH for every spectra in a ripper dict
-    using pySPLASH.
+    using pySPLASH. Spectra with identical ions are only hashed once
+
+    Hashing is CPU bound so with more than one worker the spectra are hashed
+    in worker processes. On platforms that spawn worker processes (Windows,
+    macOS) this must then be called from within an
+    `if __name__ == "__main__":` block.
 
     This returns the ripper dict except that each spectra will now have an
     associated 'splash' entry
 
     Args:
         ripper_dict (Dict): Ripper information
+        max_workers (int, optional): Number of worker processes, `None` for
+            one per CPU. Defaults to 1, hashing in the current process.
 
     Returns:
         Dict: Ripper information with pySPLASH helper information added.
     """
 
-    # Iterate through all the mslevels
-    all_mslevels = ripper_dict.keys()
-
-    for mslevel in all_mslevels:
-        # Iterate through all the spectra
-        all_spectra = ripper_dict[mslevel].keys()
-
-        for spectra in all_spectra:
-            # Grab the spectra
-            this_spectra = ripper_dict[mslevel][spectra]
-
-            # Convert that to the right format to SPLASH it
-            spectra_json = prepare_individual_spectra_for_pySPLASH(
-                this_spectra, mslevel
+    # Grab every spectra, only the ion lists of unique spectra are hashed
+    all_spectra, unique = _unique_spectra(ripper_dict)
+    ion_lists = [
+        prepare_individual_spectra_for_pySPLASH(this_spectra)
+        for this_spectra, _ in unique.values()
+    ]
+
+    # SPLASH them, results come back in the same order as the spectra
+    if max_workers == 1:
+        splash_strings = dict(
+            zip(unique, map(get_SPLASH_from_pySPLASH, ion_lists))
+        )
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            splash_strings = dict(
+                zip(
+                    unique,
+                    executor.map(
+                        get_SPLASH_from_pySPLASH, ion_lists, chunksize=32
+                    )
+                )
             )
 
-            # SPLASH it
-            splash_string = get_SPLASH_from_pySPLASH(spectra_json)
-
-            # Assign add this to the rippper dict
-            this_spectra["splash"] = splash_string
-            ripper_dict[mslevel][spectra] = this_spectra
+    # Assign add these to the rippper dict. Spectra are updated in place so
+    # the ripper dict does not need reassigning
+    for this_spectra, fingerprint in all_spectra:
+        this_spectra["splash"] = splash_strings[fingerprint]
 
     return ripper_dict
 
-def splash_ripper_dict(ripper_dict: Dict) -> Dict:
+
+def splash_ripper_dict(
+    ripper_dict: Dict, max_workers: Optional[int] = 1
+) -> Dict:
     """ This function will add a SPLASH to every spectra in a ripper dict
     It will do this using one of two different methods depending on
     which dependencies are installed. The webAPI method is glacially slow.
 
     Args:
         ripper_dict (Dict): Ripper information
+        max_workers (int, optional): Number of worker processes used to hash
+            the spectra with pySPLASH, `None` for one per CPU. Defaults to 1,
+            hashing in the current process.
 
     Returns:
         Dict: Ripper information with SPLASH helper information added.
@@ -252,7 +375,7 @@ def splash_ripper_dict(ripper_dict: Dict) -> Dict:
 
     splashed_dict = {}
     if IMPLEMENTATION == "pySPLASH":
-        splashed_dict = pySPLASH_all_spectra(ripper_dict)
+        splashed_dict = pySPLASH_all_spectra(ripper_dict, max_workers)
     elif IMPLEMENTATION == "webAPI":
         splashed_dict = APIsplash_all_spectra(ripper_dict)
     return splashed_dict
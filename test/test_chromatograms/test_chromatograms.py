@@ -2,10 +2,16 @@ import os
 import json
 import pytest
 
-from functools import partial
+from functools import lru_cache
 
 import mzmlripper.chromatograms as chrom
 
+#  faster JSON parser if installed, falls back on the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 #  data folder containing raw data and chromatograms
 DATA_FOLDER = os.path.join(
     os.path.dirname(__file__),
@@ -23,7 +29,27 @@ ABSOLUTE_ERRORS = [1, 0.1, 0.05, 0.01, 0.005]
 REL_ERRORS = [50, 25, 10, 5, 1]
 
 
-@pytest.fixture
+@lru_cache(maxsize=None)
+def _load_json(path: str):
+    """
+    Load a JSON file from the test data, only reading each file once per test
+    session. Loaded data is shared between tests so must not be modified.
+
+    Args:
+        path (str): path to the JSON file
+
+    Returns:
+        data loaded from the JSON file
+    """
+    if orjson is not None:
+        with open(path, "rb") as r:
+            return orjson.loads(r.read())
+
+    with open(path, "r") as r:
+        return json.load(r)
+
+
+@pytest.fixture(scope="session")
 def raw_data() -> dict:
     """
     Raw orbitrap ripper data from an LC-MS run. Maximum retention time = 10 min
@@ -39,11 +65,10 @@ def raw_data() -> dict:
         DATA_FOLDER,
         "converted_test_data_orbi_maxrt10min.json"
     )
-    with open(data_path, "r") as r:
-        return json.load(r)
+    return _load_json(data_path)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def legacy_bpcs() -> dict:
     """
     Base Peak Chromatograms (BPCs) generated from raw test data. BPCs at MS1
@@ -54,20 +79,19 @@ def legacy_bpcs() -> dict:
     """
     bpcs = {}
     for ms_level in [1, 2]:
-        with open(
+        bpcs[ms_level] = _load_json(
             os.path.join(
                 DATA_FOLDER,
                 f"ms{ms_level}bpc.json"
-            ),
-            "r"
-        ) as r:
-            bpcs[ms_level] = json.load(r)
+            )
+        )
 
     return bpcs
 
 
 @pytest.mark.unit
-def test_bpcs(raw_data: dict, legacy_bpcs: dict):
+@pytest.mark.parametrize("ms_level", [1, 2])
+def test_bpcs(raw_data: dict, legacy_bpcs: dict, ms_level: int):
     """
     Test to make sure the output of chromatogram.generate_bpc does not differ
     from legacy data.
@@ -76,92 +100,157 @@ def test_bpcs(raw_data: dict, legacy_bpcs: dict):
         raw_data (dict): ripper data dict in standard ripper format
         legacy_bpcs (dict): dict of legacy BPCs by level in format
             {1: MS1 BPC, 2: MS2 BPC}
+        ms_level (int): MS level of the BPC
     """
 
-    bpc = partial(
-        chrom.generate_chromatogram,
+    #  generate the BPC for the MS level
+    bpc = chrom.generate_chromatogram(
         ms_data=raw_data,
-        chromatogram="bpc"
+        chromatogram="bpc",
+        ms_level=ms_level
     )
 
-    #  generate BPCs for MS1 and MS2 data
-    ms1_bpc = bpc(ms_level=1)
-    ms2_bpc = bpc(ms_level=2)
-
-    #  go through MS1 and MS2 BPCs and make sure they are identical to
-    #  BPCs generated previously from same data
-    for i, bpc in enumerate([ms1_bpc, ms2_bpc]):
-        assert [list(data) for data in bpc] == legacy_bpcs[i + 1]
+    #  make sure the BPC is identical to the BPC generated previously from
+    #  same data
+    assert [list(data) for data in bpc] == legacy_bpcs[ms_level]
 
 
 @pytest.mark.unit
-def test_eic_relative(raw_data: dict):
+@pytest.mark.parametrize("target_mass", TARGET_MASSES)
+@pytest.mark.parametrize("rel_error", REL_ERRORS)
+def test_eic_relative(raw_data: dict, target_mass: float, rel_error: float):
     """
-    Test for generating EICs using relative error units ("ppm").
+    Test for generating EICs using relative error units ("ppm"). Checks the
+    EIC function is working correctly for each target mass at each relative
+    error value.
 
     Args:
         raw_data (dict): ripper data dict in standard ripper format
+        target_mass (float): target m/z of the EIC
+        rel_error (float): error tolerance (ppm)
     """
 
     #  navigate to relative data directory containing EICs generated using
     #  relative values for error tolerance
     relative_data_dir = os.path.join(DATA_FOLDER, "relative_eics")
 
-    #  iterate through EIC target masses, check the EIC function is working
-    #  correctly for each target at all relative error values
-    for target_mass in TARGET_MASSES:
-
-        for rel_error in REL_ERRORS:
-
-            rel_eic = chrom.generate_EIC(
-                ms_data=raw_data,
-                target_mass=target_mass,
-                error_tolerance=rel_error,
-                error_units="ppm"
-            )
-            raw_file = os.path.join(
-                relative_data_dir,
-                f"target={target_mass}mz_{rel_error}ppm_error.json"
-            )
+    rel_eic = chrom.generate_EIC(
+        ms_data=raw_data,
+        target_mass=target_mass,
+        error_tolerance=rel_error,
+        error_units="ppm"
+    )
+    raw_file = os.path.join(
+        relative_data_dir,
+        f"target={target_mass}mz_{rel_error}ppm_error.json"
+    )
 
-            with open(raw_file, "r") as r:
-                legacy_eic = json.load(r)
+    legacy_eic = _load_json(raw_file)
 
-            assert [list(peak) for peak in rel_eic] == legacy_eic
+    assert [list(peak) for peak in rel_eic] == legacy_eic
 
 
 @pytest.mark.unit
-def test_eic_absolute(raw_data):
+@pytest.mark.parametrize("target_mass", TARGET_MASSES)
+@pytest.mark.parametrize("abs_error", ABSOLUTE_ERRORS)
+def test_eic_absolute(raw_data: dict, target_mass: float, abs_error: float):
     """
-    Test for generating EIC using absolute error units ("u").
+    Test for generating EIC using absolute error units ("u"). Checks the EIC
+    function is working correctly for each target mass at each absolute error
+    value.
 
     Args:
         raw_data (dict): ripper data dict in standard ripper format
+        target_mass (float): target m/z of the EIC
+        abs_error (float): error tolerance (u)
     """
 
     #  navigate to relative data directory containing EICs generated using
     #  absolute values for error tolerance
     abs_data_dir = os.path.join(DATA_FOLDER, "absolute_eics")
 
-    #  iterate through EIC target masses, check the EIC function is working
-    #  correctly for each target at all absolute error values
+    abs_eic = chrom.generate_EIC(
+        ms_data=raw_data,
+        target_mass=target_mass,
+        error_tolerance=abs_error,
+        error_units="u"
+    )
+
+    raw_file = os.path.join(
+        abs_data_dir,
+        f"target={target_mass}mz_{abs_error}u_error.json"
+    )
+
+    legacy_eic = _load_json(raw_file)
+
+    assert [list(peak) for peak in abs_eic] == legacy_eic
+
+
+@pytest.mark.unit
+def test_eic_retention_time_window(raw_data: dict):
+    """
+    Test for restricting EICs to a retention time window with min_rt and
+    max_rt.
+
+    Args:
+        raw_data (dict): ripper data dict in standard ripper format
+    """
+
+    min_rt, max_rt = 2, 6
+
+    #  EICs over the full retention time range, at 10 ppm error tolerance
+    relative_data_dir = os.path.join(DATA_FOLDER, "relative_eics")
+
     for target_mass in TARGET_MASSES:
 
-        for abs_error in ABSOLUTE_ERRORS:
+        eic = chrom.generate_EIC(
+            ms_data=raw_data,
+            target_mass=target_mass,
+            error_tolerance=10,
+            error_units="ppm",
+            min_rt=min_rt,
+            max_rt=max_rt
+        )
 
-            abs_eic = chrom.generate_EIC(
-                ms_data=raw_data,
-                target_mass=target_mass,
-                error_tolerance=abs_error,
-                error_units="u"
-            )
+        raw_file = os.path.join(
+            relative_data_dir,
+            f"target={target_mass}mz_10ppm_error.json"
+        )
 
-            raw_file = os.path.join(
-                abs_data_dir,
-                f"target={target_mass}mz_{abs_error}u_error.json"
-            )
+        legacy_eic = _load_json(raw_file)
+
+        #  the windowed EIC is the legacy EIC trimmed to the window
+        assert [list(peak) for peak in eic] == [
+            peak for peak in legacy_eic if min_rt <= peak[0] <= max_rt
+        ]
 
-            with open(raw_file, "r") as r:
-                legacy_eic = json.load(r)
 
-            assert [list(peak) for peak in abs_eic] == legacy_eic
+@pytest.mark.unit
+def test_eic_unsorted_mass_list():
+    """
+    Test to make sure masses are matched correctly when a spectrum's mass list
+    is not sorted in ascending order.
+    """
+
+    spectrum = {
+        "300.0000": 3000,
+        "100.0000": 1000,
+        "100.0010": 500,
+        "200.0000": 2000,
+        "retention_time": "1.5",
+        "mass_list": [300.0, 100.0, 100.001, 200.0],
+    }
+
+    assert chrom.match_mass(
+        candidates=spectrum["mass_list"],
+        range=(99.999, 100.002)
+    ) == [100.0, 100.001]
+
+    eic = chrom.generate_EIC(
+        ms_data={"ms1": {"spectrum_1": spectrum}},
+        target_mass=100.0,
+        error_tolerance=0.005,
+        error_units="u"
+    )
+
+    assert list(eic) == [(1.5, 1500.0)]
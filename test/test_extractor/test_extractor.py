@@ -0,0 +1,55 @@
+import os
+import json
+import shutil
+import pytest
+
+from mzmlripper.extractor import process_multiple_files
+
+#  data folder containing test mzML file and ripper data
+DATA_FOLDER = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "test_data",
+    "mzml"
+)
+
+#  small mzML file with MS1, MS2 and MS3 spectra
+MZML_FILE = os.path.join(DATA_FOLDER, "test_spectra.mzML")
+
+
+@pytest.mark.unit
+def test_process_multiple_files(tmp_path):
+    """
+    Test to make sure every mzML file in a folder, and only those files, are
+    ripped in worker processes, with each JSON file not differing from legacy
+    data.
+
+    Args:
+        tmp_path: location of the data folder and output directory
+    """
+
+    data_folder = os.path.join(tmp_path, "data")
+    out_dir = os.path.join(tmp_path, "output")
+    os.makedirs(data_folder)
+
+    #  two copies of the test file, and a backup that is not an mzML file
+    for name in ["first.mzML", "second.mzML", "first.mzML.bak"]:
+        shutil.copy(MZML_FILE, os.path.join(data_folder, name))
+
+    processed = process_multiple_files(data_folder, out_dir, max_workers=2)
+
+    assert sorted(processed) == [
+        os.path.join(data_folder, "first.mzML"),
+        os.path.join(data_folder, "second.mzML")
+    ]
+    assert sorted(os.listdir(out_dir)) == [
+        "ripper_first.json",
+        "ripper_second.json"
+    ]
+
+    with open(os.path.join(DATA_FOLDER, "ripper_test_spectra.json")) as r:
+        legacy_output = json.load(r)
+
+    for name in ["ripper_first.json", "ripper_second.json"]:
+        with open(os.path.join(out_dir, name)) as r:
+            assert json.load(r) == legacy_output
@@ -0,0 +1,306 @@
+import os
+import json
+import zlib
+import base64
+import struct
+import pytest
+
+from mzmlripper import mzml_parser
+from mzmlripper.mzml_parser import MzmlParser
+from mzmlripper.spectrum import Spectrum
+
+#  data folder containing test mzML file and ripper data
+DATA_FOLDER = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "test_data",
+    "mzml"
+)
+
+#  small mzML file with MS1, MS2 and MS3 spectra
+MZML_FILE = os.path.join(DATA_FOLDER, "test_spectra.mzML")
+
+
+def load_legacy_output(relative: bool) -> dict:
+    """
+    Load ripper data generated previously from the test mzML file.
+
+    Args:
+        relative (bool): load ripper data with relative intensities.
+
+    Returns:
+        dict: ripper data dict in standard ripper format
+    """
+    suffix = "_relative" if relative else ""
+    data_path = os.path.join(DATA_FOLDER, f"ripper_test_spectra{suffix}.json")
+
+    with open(data_path, "r") as r:
+        return json.load(r)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("relative", [False, True])
+def test_parse_file(tmp_path, relative: bool):
+    """
+    Test to make sure the ripper data parsed from an mzML file, and the JSON
+    file written out, do not differ from legacy data.
+
+    Args:
+        tmp_path: output directory for the JSON file
+        relative (bool): rip the file with relative intensities
+    """
+
+    output = MzmlParser(
+        MZML_FILE,
+        str(tmp_path),
+        relative_intensity=relative
+    ).parse_file()
+
+    #  round trip through JSON so in memory float keys of relative spectra
+    #  compare equal to the keys in the legacy file
+    legacy_output = load_legacy_output(relative)
+    assert json.loads(json.dumps(output)) == legacy_output
+
+    with open(os.path.join(tmp_path, "ripper_test_spectra.json"), "r") as r:
+        assert json.load(r) == legacy_output
+
+
+@pytest.mark.unit
+def test_parse_file_without_lxml(tmp_path, monkeypatch):
+    """
+    Test to make sure the standard library XML parser, used when lxml is not
+    installed, gives the same ripper data as the legacy data.
+
+    Args:
+        tmp_path: output directory for the JSON file
+        monkeypatch: used to hide lxml from the parser module
+    """
+
+    monkeypatch.setattr(mzml_parser, "etree", None)
+
+    output = MzmlParser(MZML_FILE, str(tmp_path)).parse_file()
+
+    assert output == load_legacy_output(relative=False)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("relative", [False, True])
+def test_write_json_without_orjson(tmp_path, monkeypatch, relative: bool):
+    """
+    Test to make sure the JSON file written by the standard library `json`
+    module, used when orjson is not installed, is identical to the file
+    written with orjson.
+
+    Args:
+        tmp_path: output directory for the JSON files
+        monkeypatch: used to hide orjson from the parser module
+        relative (bool): rip the file with relative intensities
+    """
+
+    if mzml_parser.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    output = MzmlParser(
+        MZML_FILE,
+        str(tmp_path),
+        relative_intensity=relative
+    ).parse_file()
+
+    orjson_file = os.path.join(tmp_path, "orjson.json")
+    json_file = os.path.join(tmp_path, "json.json")
+    mzml_parser.write_json(output, orjson_file)
+    monkeypatch.setattr(mzml_parser, "orjson", None)
+    mzml_parser.write_json(output, json_file)
+
+    with open(orjson_file, "rb") as a, open(json_file, "rb") as b:
+        assert a.read() == b.read()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("use_lxml", [True, False])
+def test_walk_tree_skips_and_frees_elements(
+    tmp_path, monkeypatch, use_lxml: bool
+):
+    """
+    Test to make sure both XML walkers only extract the spectra, skipping the
+    chromatogram in the test file, and clear every element once it has been
+    handled.
+
+    Args:
+        tmp_path: output directory for the JSON file
+        monkeypatch: used to hide lxml from the parser module
+        use_lxml (bool): walk the file with lxml rather than the standard
+            library parser
+    """
+
+    if not use_lxml:
+        monkeypatch.setattr(mzml_parser, "etree", None)
+    elif mzml_parser.etree is None:
+        pytest.skip("lxml is not installed")
+
+    parser = MzmlParser(MZML_FILE, str(tmp_path))
+
+    #  keep hold of every element handed to extract_spectrum
+    elements = []
+    extract_spectrum = parser.extract_spectrum
+
+    def record(element):
+        elements.append(element)
+        extract_spectrum(element)
+
+    monkeypatch.setattr(parser, "extract_spectrum", record)
+    parser.walk_tree()
+
+    assert [element.tag.rpartition("}")[2] for element in elements] == (
+        ["spectrum"] * 16
+    )
+    assert len(parser.spectra) == 16
+
+    #  handled elements are emptied so they can be garbage collected
+    assert all(
+        len(element) == 0 and not element.attrib for element in elements
+    )
+
+
+@pytest.mark.unit
+def test_parse_file_worker_processes(tmp_path):
+    """
+    Test to make sure processing the spectra in worker processes gives the
+    same ripper data as the legacy data.
+
+    Args:
+        tmp_path: output directory for the JSON file
+    """
+
+    output = MzmlParser(MZML_FILE, str(tmp_path), max_workers=2).parse_file()
+
+    assert output == load_legacy_output(relative=False)
+
+
+@pytest.mark.unit
+def test_parse_file_ms_levels(tmp_path):
+    """
+    Test to make sure only the requested MS levels are extracted, and that
+    they do not differ from the legacy data.
+
+    Args:
+        tmp_path: output directory for the JSON file
+    """
+
+    output = MzmlParser(MZML_FILE, str(tmp_path), ms_levels=[2]).parse_file()
+
+    assert output == {"ms2": load_legacy_output(relative=False)["ms2"]}
+
+
+@pytest.mark.unit
+def test_output_directory_created(tmp_path):
+    """
+    Test to make sure the JSON file is named after the mzML file and written
+    to the output directory, creating the directory if it does not exist.
+
+    Args:
+        tmp_path: parent of the output directory for the JSON file
+    """
+
+    out_dir = os.path.join(tmp_path, "nested", "output")
+    MzmlParser(MZML_FILE, out_dir).parse_file()
+
+    assert os.listdir(out_dir) == ["ripper_test_spectra.json"]
+
+
+@pytest.mark.unit
+def test_spectra_sorted_by_retention_time(tmp_path):
+    """
+    Test to make sure spectra are numbered in order of increasing retention
+    time, comparing retention times as numbers rather than strings.
+
+    Args:
+        tmp_path: output directory for the JSON file
+    """
+
+    parser = MzmlParser(MZML_FILE, str(tmp_path))
+    parser.ms[1] = []
+
+    for retention_time in [9.5, 10.5, 2.0]:
+        spec = Spectrum(intensity_threshold=1000)
+        spec.ms_level = 1
+        spec.retention_time_value = retention_time
+        spec.retention_time = str(retention_time)
+        spec.serialized = {
+            "retention_time": spec.retention_time,
+            "mass_list": [100.0]
+        }
+        parser.ms[1].append(spec)
+
+    output = parser.build_output()
+
+    assert [
+        spectrum["retention_time"] for spectrum in output["ms1"].values()
+    ] == ["2.0", "9.5", "10.5"]
+
+
+#  minimal mzML file with a single MS1 spectrum, with placeholders for the
+#  binary data of its m/z and intensity arrays
+MIXED_TYPES_MZML = """<?xml version="1.0" encoding="utf-8"?>
+<mzML xmlns="http://psi.hupo.org/ms/mzml" version="1.1.0">
+  <run id="test">
+    <spectrumList count="1">
+      <spectrum index="0" id="scan=1" defaultArrayLength="2">
+        <cvParam cvRef="MS" accession="MS:1000511" name="ms level" value="1"/>
+        <scanList count="1">
+          <scan>
+            <cvParam cvRef="MS" accession="MS:1000016" name="scan start time"
+                value="1.5"/>
+          </scan>
+        </scanList>
+        <binaryDataArrayList count="2">
+          <binaryDataArray>
+            <cvParam cvRef="MS" accession="MS:1000523" name="64-bit float"/>
+            <cvParam cvRef="MS" accession="MS:1000574"
+                name="zlib compression"/>
+            <cvParam cvRef="MS" accession="MS:1000514" name="m/z array"/>
+            <binary>{mz}</binary>
+          </binaryDataArray>
+          <binaryDataArray>
+            <cvParam cvRef="MS" accession="MS:1000521" name="32-bit float"/>
+            <cvParam cvRef="MS" accession="MS:1000574"
+                name="zlib compression"/>
+            <cvParam cvRef="MS" accession="MS:1000515"
+                name="intensity array"/>
+            <binary>{intensity}</binary>
+          </binaryDataArray>
+        </binaryDataArrayList>
+      </spectrum>
+    </spectrumList>
+  </run>
+</mzML>
+"""
+
+
+@pytest.mark.unit
+def test_parse_mixed_data_types(tmp_path):
+    """
+    Test to make sure spectra with 64-bit m/z values and 32-bit intensities
+    are decoded using the data type of each array.
+
+    Args:
+        tmp_path: location of the mzML file and the JSON file
+    """
+
+    def encode(values: list, d_type: str) -> str:
+        packed = struct.pack(f"<{len(values)}{d_type}", *values)
+        return base64.b64encode(zlib.compress(packed)).decode()
+
+    mzml_file = os.path.join(tmp_path, "mixed_types.mzML")
+    with open(mzml_file, "w") as w:
+        w.write(
+            MIXED_TYPES_MZML.format(
+                mz=encode([100.12345, 200.5], "d"),
+                intensity=encode([5000.0, 2000.0], "f")
+            )
+        )
+
+    output = MzmlParser(mzml_file, str(tmp_path)).parse_file()
+
+    assert output["ms1"]["spectrum_1"]["100.1235"] == 5000
+    assert output["ms1"]["spectrum_1"]["mass_list"] == [100.1235, 200.5]
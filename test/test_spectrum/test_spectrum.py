@@ -0,0 +1,107 @@
+import zlib
+import base64
+import struct
+import pytest
+
+from mzmlripper.spectrum import ArrayLengthMismatch, Spectrum
+
+
+@pytest.mark.unit
+def test_convert_to_relative():
+    """
+    Test to make sure intensities are converted relative to the base peak,
+    with ions ordered by increasing intensity.
+    """
+
+    spectrum = Spectrum(intensity_threshold=1000, relative=True)
+    spectrum_dict = {
+        "100.0000": 2000,
+        "200.0000": 8000,
+        "300.0000": 4000,
+        "retention_time": "1.0",
+        "mass_list": [100.0, 200.0, 300.0],
+    }
+
+    relative = spectrum.convert_to_relative(spectrum_dict)
+
+    assert list(relative.items()) == [
+        ("retention_time", "1.0"),
+        ("mass_list", [100.0, 200.0, 300.0]),
+        (100.0, 25.0),
+        (300.0, 50.0),
+        (200.0, 100.0),
+        ("base_peak", [200.0, 8000.0]),
+    ]
+
+
+@pytest.mark.unit
+def test_convert_to_relative_no_ions():
+    """
+    Test to make sure a spectrum with no ions above the intensity threshold
+    is left without ions or a base peak rather than raising an error.
+    """
+
+    spectrum = Spectrum(intensity_threshold=1000, relative=True)
+    spectrum_dict = {"retention_time": "1.0", "mass_list": []}
+
+    assert spectrum.convert_to_relative(spectrum_dict) == spectrum_dict
+
+
+def encode_array(values: list, d_type: str) -> bytes:
+    """
+    Encode values the way mzML binary data is stored, as zlib compressed,
+    Base64 encoded little endian floats.
+
+    Args:
+        values (list): values to encode
+        d_type (str): struct format of each value, "f" or "d"
+
+    Returns:
+        bytes: Base64 encoded binary data
+    """
+
+    return base64.b64encode(
+        zlib.compress(struct.pack(f"<{len(values)}{d_type}", *values))
+    )
+
+
+@pytest.mark.unit
+def test_mixed_data_types():
+    """
+    Test to make sure 64-bit m/z values are read alongside 32-bit
+    intensities, each array using its own data type.
+    """
+
+    spectrum = Spectrum(intensity_threshold=1000)
+    spectrum.ms_level = 1
+    spectrum.array_length = "2"
+    spectrum.compression = "zlib compression"
+    spectrum.mz_d_type = "64-bit float"
+    spectrum.intensity_d_type = "32-bit float"
+    spectrum.mz = encode_array([100.12345, 200.5], "d")
+    spectrum.intensity = encode_array([5000.0, 2000.0], "f")
+
+    spectrum.process()
+
+    assert spectrum.serialized["100.1235"] == 5000
+    assert spectrum.serialized["200.5000"] == 2000
+    assert spectrum.serialized["mass_list"] == [100.1235, 200.5]
+
+
+@pytest.mark.unit
+def test_array_length_mismatch():
+    """
+    Test to make sure binary data that does not hold the array length of the
+    spectrum raises an error rather than being read as other values.
+    """
+
+    spectrum = Spectrum(intensity_threshold=1000)
+    spectrum.array_length = "2"
+    spectrum.compression = "zlib compression"
+    spectrum.mz_d_type = "64-bit float"
+    spectrum.intensity_d_type = "64-bit float"
+    spectrum.mz = encode_array([100.0, 200.0], "d")
+    spectrum.intensity = encode_array([5000.0, 2000.0], "f")
+
+    with pytest.raises(ArrayLengthMismatch):
+        spectrum.process()
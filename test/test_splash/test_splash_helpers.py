@@ -0,0 +1,310 @@
+import os
+import sys
+import copy
+import json
+import types
+import hashlib
+import importlib
+import threading
+import multiprocessing
+import pytest
+
+from mzmlripper.mzml_parser import MzmlParser
+
+#  data folder containing test mzML file and ripper data
+DATA_FOLDER = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "test_data",
+    "mzml"
+)
+
+#  small mzML file with MS1, MS2 and MS3 spectra
+MZML_FILE = os.path.join(DATA_FOLDER, "test_spectra.mzML")
+
+#  ion lists hashed by the fake pySPLASH module, in the current process
+HASHED_IONS = []
+
+#  spectra JSON posted to the fake SPLASH web API
+POSTED_SPECTRA = []
+POSTED_LOCK = threading.Lock()
+
+
+def fake_splash(ions: list) -> str:
+    """
+    Fake SPLASH of a list of ions, which only depends on the ions.
+
+    Args:
+        ions (list): list of (m/z, intensity) tuples
+
+    Returns:
+        str: fake SPLASH
+    """
+    return "splash-" + hashlib.md5(repr(ions).encode()).hexdigest()
+
+
+class FakeSpectrum:
+    """
+    Stand in for `splash.Spectrum`.
+    """
+
+    def __init__(self, ions: list, spectrum_type: str):
+        self.ions = ions
+
+
+class FakeSplash:
+    """
+    Stand in for `splash.Splash`, recording every ion list it hashes.
+    """
+
+    def splash(self, spectrum: FakeSpectrum) -> str:
+        HASHED_IONS.append(spectrum.ions)
+        return fake_splash(spectrum.ions)
+
+
+#  fake pySPLASH module
+FAKE_SPLASH_MODULE = types.ModuleType("splash")
+FAKE_SPLASH_MODULE.Spectrum = FakeSpectrum
+FAKE_SPLASH_MODULE.SpectrumType = types.SimpleNamespace(MS="MS")
+FAKE_SPLASH_MODULE.Splash = FakeSplash
+
+
+class FakeResponse:
+    """
+    Stand in for `requests.Response`.
+    """
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+
+class FakeSession:
+    """
+    Stand in for `requests.Session`, recording every spectra posted to it and
+    answering with the fake SPLASH of its ions.
+    """
+
+    #  status code of every response
+    status_code = 200
+
+    def post(self, url: str, json: dict) -> FakeResponse:
+        with POSTED_LOCK:
+            POSTED_SPECTRA.append(json)
+
+        ions = [(ion["mass"], ion["intensity"]) for ion in json["ions"]]
+        return FakeResponse(self.status_code, fake_splash(ions).encode())
+
+
+@pytest.fixture
+def splash_helpers(monkeypatch):
+    """
+    The splash_helpers module, imported with the fake pySPLASH module and
+    with requests replaced by the fake session.
+
+    Args:
+        monkeypatch: used to install the fake modules
+
+    Returns:
+        module: mzmlripper.splash_helpers
+    """
+
+    HASHED_IONS.clear()
+    POSTED_SPECTRA.clear()
+    FakeSession.status_code = 200
+
+    monkeypatch.setitem(sys.modules, "splash", FAKE_SPLASH_MODULE)
+    monkeypatch.delitem(
+        sys.modules, "mzmlripper.splash_helpers", raising=False
+    )
+    module = importlib.import_module("mzmlripper.splash_helpers")
+
+    monkeypatch.setattr(
+        module,
+        "requests",
+        types.SimpleNamespace(Session=FakeSession),
+        raising=False
+    )
+    monkeypatch.setattr(module, "_SESSIONS", threading.local())
+
+    yield module
+
+    sys.modules.pop("mzmlripper.splash_helpers", None)
+
+
+@pytest.fixture
+def ripper_data() -> dict:
+    """
+    Ripper data of the test mzML file, with a copy of the first MS1 spectrum
+    taken at a different scan and retention time.
+
+    Returns:
+        dict: ripper data dict in standard ripper format
+    """
+
+    with open(os.path.join(DATA_FOLDER, "ripper_test_spectra.json")) as r:
+        data = json.load(r)
+
+    duplicate = dict(data["ms1"]["spectrum_1"])
+    duplicate["scan"] = "100"
+    duplicate["retention_time"] = "9.0"
+    data["ms1"]["duplicate"] = duplicate
+
+    return data
+
+
+def all_splashes(ripper_data: dict) -> dict:
+    """
+    Collect the SPLASH of every spectrum in ripper data.
+
+    Args:
+        ripper_data (dict): ripper data dict with SPLASHes
+
+    Returns:
+        dict: SPLASH of each spectrum by MS level and spectrum name
+    """
+    return {
+        (ms_level, name): spectrum["splash"]
+        for ms_level, spectra in ripper_data.items()
+        for name, spectrum in spectra.items()
+    }
+
+
+@pytest.mark.unit
+def test_pysplash_identical_spectra_hashed_once(splash_helpers, ripper_data):
+    """
+    Test to make sure spectra with identical ions are only hashed once with
+    pySPLASH, and that every one of them is given the SPLASH.
+
+    Args:
+        splash_helpers: splash_helpers module using the fake pySPLASH
+        ripper_data (dict): ripper data with a duplicated spectrum
+    """
+
+    n_spectra = sum(len(spectra) for spectra in ripper_data.values())
+
+    splash_helpers.pySPLASH_all_spectra(ripper_data)
+
+    assert len(HASHED_IONS) == n_spectra - 1
+    assert len(set(map(repr, HASHED_IONS))) == n_spectra - 1
+
+    ms1 = ripper_data["ms1"]
+    assert ms1["duplicate"]["splash"] == ms1["spectrum_1"]["splash"]
+    assert ms1["spectrum_1"]["splash"] == fake_splash(
+        splash_helpers.prepare_individual_spectra_for_pySPLASH(
+            ms1["spectrum_1"]
+        )
+    )
+    assert len(all_splashes(ripper_data)) == n_spectra
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(
+    multiprocessing.get_all_start_methods()[0] != "fork",
+    reason="worker processes cannot import the fake pySPLASH module"
+)
+def test_pysplash_worker_processes(splash_helpers, ripper_data):
+    """
+    Test to make sure hashing spectra in worker processes gives the same
+    SPLASHes as hashing them in the current process.
+
+    Args:
+        splash_helpers: splash_helpers module using the fake pySPLASH
+        ripper_data (dict): ripper data with a duplicated spectrum
+    """
+
+    serial = splash_helpers.pySPLASH_all_spectra(copy.deepcopy(ripper_data))
+    parallel = splash_helpers.pySPLASH_all_spectra(
+        copy.deepcopy(ripper_data), max_workers=2
+    )
+
+    assert all_splashes(parallel) == all_splashes(serial)
+
+
+@pytest.mark.unit
+def test_api_identical_spectra_posted_once(splash_helpers, ripper_data):
+    """
+    Test to make sure spectra with identical ions are only posted once to the
+    SPLASH web API, and that every one of them is given the SPLASH.
+
+    Args:
+        splash_helpers: splash_helpers module using the fake session
+        ripper_data (dict): ripper data with a duplicated spectrum
+    """
+
+    n_spectra = sum(len(spectra) for spectra in ripper_data.values())
+
+    api = splash_helpers.APIsplash_all_spectra(
+        copy.deepcopy(ripper_data), max_workers=2
+    )
+    pysplash = splash_helpers.pySPLASH_all_spectra(ripper_data)
+
+    assert len(POSTED_SPECTRA) == n_spectra - 1
+    assert api["ms1"]["duplicate"]["splash"] == (
+        api["ms1"]["spectrum_1"]["splash"]
+    )
+    assert all_splashes(api) == all_splashes(pysplash)
+
+
+@pytest.mark.unit
+def test_api_failure_stops_requests(splash_helpers, ripper_data):
+    """
+    Test to make sure a bad response from the SPLASH web API raises an error
+    and the requests not yet sent are cancelled.
+
+    Args:
+        splash_helpers: splash_helpers module using the fake session
+        ripper_data (dict): ripper data with a duplicated spectrum
+    """
+
+    FakeSession.status_code = 500
+    n_spectra = sum(len(spectra) for spectra in ripper_data.values())
+
+    with pytest.raises(Exception, match="bad response"):
+        splash_helpers.APIsplash_all_spectra(ripper_data, max_workers=1)
+
+    #  the request in flight when the error was raised may still be sent
+    assert 1 <= len(POSTED_SPECTRA) <= 2 < n_spectra - 1
+    assert not any(
+        "splash" in spectrum
+        for spectra in ripper_data.values()
+        for spectrum in spectra.values()
+    )
+
+
+@pytest.mark.unit
+def test_relative_spectra(splash_helpers, tmp_path):
+    """
+    Test to make sure spectra ripped with relative intensities, which are
+    keyed by float m/z values and have a base peak, are SPLASHed from their
+    ions only.
+
+    Args:
+        splash_helpers: splash_helpers module using the fake pySPLASH and
+            session
+        tmp_path: output directory for the JSON file
+    """
+
+    relative = MzmlParser(
+        MZML_FILE,
+        str(tmp_path),
+        relative_intensity=True
+    ).parse_file()
+
+    api = splash_helpers.APIsplash_all_spectra(copy.deepcopy(relative))
+    pysplash = splash_helpers.splash_ripper_dict(relative)
+
+    for ions in HASHED_IONS:
+        assert ions
+        assert all(
+            isinstance(mass, float) and isinstance(intensity, float)
+            for mass, intensity in ions
+        )
+
+    spectrum = pysplash["ms1"]["spectrum_1"]
+    assert spectrum["splash"] == fake_splash([
+        (mass, intensity)
+        for mass, intensity in spectrum.items()
+        if isinstance(mass, float)
+    ])
+    assert all_splashes(api) == all_splashes(pysplash)